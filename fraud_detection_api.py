@@ -1,10 +1,13 @@
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 from datetime import datetime, timedelta, time
+from functools import lru_cache
 from typing import List, Optional
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 
+# Pydantic builds the validator when the class is defined, i.e. once per worker at import
 class Transaction(BaseModel):
     id: str
     amount: float
@@ -15,23 +18,23 @@ class Transaction(BaseModel):
     high_value_tx_count: int
     account_creation_date: datetime
     is_verified: bool
-    transaction_time_weekday: datetime
 
 class FraudRule:
-    def __init__(self, rule_id, description, action, condition):
+    def __init__(self, rule_id, description, action, condition, categorical=False):
         self.rule_id = rule_id
         self.description = description
         self.action = action  # Either "review" or "reject"
-        self.condition = condition
-
-    def evaluate(self, transaction):
-        if self.condition(transaction):
-            return self.action, self.description
-        return None, None
+        self.condition = condition  # Python expression over the transaction `t`
+        # Categorical conditions read only payment_channel, device_type, location and weekday,
+        # and are written against those names instead of `t`
+        self.categorical = categorical
 
 class FraudDetector:
     def __init__(self):
         self.rules = self.create_rules()
+        self._categorical = self.compile_categorical_rules(self.rules)
+        self._check = self.compile_rules(self.rules)
+        self._decide = self.compile_rules(self.rules, short_circuit=True)
 
     def create_rules(self):
         return [
@@ -40,83 +43,140 @@ class FraudDetector:
                 rule_id="R1",
                 description="High transaction amount",
                 action="review",
-                condition=lambda t: t.amount > 500_000
+                condition="t.amount > 500_000"
             ),
             # Payment Channel Rule
             FraudRule(
                 rule_id="R2",
                 description="Web channel transaction",
                 action="reject",
-                condition=lambda t: t.payment_channel == "web"
+                condition="payment_channel == 'web'",
+                categorical=True
             ),
             # Device Type Rule/p
             FraudRule(
                 rule_id="R3",
                 description="Transaction from iOS device",
                 action="review",
-                condition=lambda t: t.device_type == "iOS"
+                condition="device_type == 'iOS'",
+                categorical=True
             ),
             # Transaction Time Rule
             FraudRule(
                 rule_id="R4",
                 description="Late-night transaction",
                 action="review",
-                condition=lambda t: time(23, 0) <= t.transaction_time.time() or t.transaction_time.time() <= time(5, 0)
+                condition="_t23 <= t.transaction_time.time() or t.transaction_time.time() <= _t5"
             ),
             # Geographic Location Rule
             FraudRule(
                 rule_id="R5",
                 description="Transaction from Lagos, Nigeria",
                 action="reject",
-                condition=lambda t: t.location == "Lagos, Nigeria"
+                condition="location == 'Lagos, Nigeria'",
+                categorical=True
             ),
             # Transaction Frequency Rule
             FraudRule(
                 rule_id="R6",
                 description="Frequent high-value transactions",
                 action="review",
-                condition=lambda t: t.high_value_tx_count > 5
+                condition="t.high_value_tx_count > 5"
             ),
             # Account Status Rule
             FraudRule(
                 rule_id="R7",
                 description="Account created recently",
                 action="review",
-                condition=lambda t: (datetime.now() - t.account_creation_date).days <= 30
+                condition="t.account_creation_date > _cutoff"
             ),
             # Identity Verification Rule
             FraudRule(
                 rule_id="R8",
                 description="Unverified account",
                 action="reject",
-                condition=lambda t: not t.is_verified
+                condition="not t.is_verified"
             ),
             # Time Off Period Rule
             FraudRule(
                 rule_id="R9",
                 description="Transaction during restricted period",
                 action="reject",
-                condition=lambda t: t.transaction_time.weekday() >= 6  #Sunday
+                condition="weekday >= 6",  #Sunday
+                categorical=True
             )
         ]
 
-    def check_fraud(self, transaction: Transaction):
-        actions = []
-        for rule in self.rules:
-            action, description = rule.evaluate(transaction)
-            if action:
-                actions.append({"action": action, "reason": description})
-        return actions
+    def compile_categorical_rules(self, rules):
+        # Few distinct (channel, device, location, weekday) combinations occur, so their outcomes are cached
+        conditions = "".join(f"{rule.condition}, " for rule in rules if rule.categorical)
+        source = f"def _categorical(payment_channel, device_type, location, weekday):\n    return ({conditions})"
+        namespace = {}
+        exec(source, namespace)
+        return lru_cache(maxsize=4096)(namespace["_categorical"])
+
+    def compile_rules(self, rules, short_circuit=False):
+        # Inline every rule into one function so a check is a single call
+        lines = [
+            "def _check(t, _cutoff, _t23=time(23, 0), _t5=time(5, 0)):",
+            "    c = _categorical(t.payment_channel, t.device_type, t.location, t.transaction_time.weekday())",
+            "    a = []"
+        ]
+        categorical_index = {rule.rule_id: i for i, rule in enumerate(r for r in rules if r.categorical)}
+        if short_circuit:
+            # Reject rules go first and the first hit ends the check
+            rules = [r for r in rules if r.action == "reject"] + [r for r in rules if r.action != "reject"]
+        for rule in rules:
+            result = f"({rule.action!r}, {rule.description!r})"
+            if rule.categorical:
+                lines.append(f"    if c[{categorical_index[rule.rule_id]}]:")
+            else:
+                lines.append(f"    if {rule.condition}:")
+            if short_circuit and rule.action == "reject":
+                lines.append(f"        return [{result}]")
+            else:
+                lines.append(f"        a.append({result})")
+        lines.append("    return a")
+        namespace = {"time": time, "_categorical": self._categorical}
+        exec("\n".join(lines), namespace)
+        return namespace["_check"]
+
+    def account_cutoff(self):
+        # Accounts under 31 days old count as recent, i.e. (now - created).days <= 30
+        return datetime.now() - timedelta(days=31)
+
+    def check_fraud(self, transaction: Transaction, short_circuit: bool = False, cutoff: Optional[datetime] = None):
+        # Returns (action, reason) tuples; they're only turned into dicts for the response
+        # short_circuit returns only the first reject reason, for callers that just need the decision
+        check = self._decide if short_circuit else self._check
+        # Batch callers pass a shared cutoff so the clock is read once per batch
+        if cutoff is None:
+            cutoff = self.account_cutoff()
+        return check(transaction, cutoff)
 
 # Initialize fraud detector
 fraud_detector = FraudDetector()
 
-@app.post("/check_transaction/")
-async def check_transaction(transaction: Transaction):
-    fraud_results = fraud_detector.check_fraud(transaction)
+def build_response(transaction: Transaction, fraud_results):
     if not fraud_results:
         return {"transaction_id": transaction.id, "status": "clear", "details": "No fraud detected"}
-    return {"transaction_id": transaction.id, "status": "flagged", "details": fraud_results}
+    details = [{"action": action, "reason": reason} for action, reason in fraud_results]
+    return {"transaction_id": transaction.id, "status": "flagged", "details": details}
+
+# Rule checks are pure CPU work, so plain `def` handlers run in FastAPI's threadpool
+@app.post("/check_transaction/")
+def check_transaction(transaction: Transaction, short_circuit: bool = False):
+    fraud_results = fraud_detector.check_fraud(transaction, short_circuit=short_circuit)
+    return build_response(transaction, fraud_results)
+
+# FastAPI builds the List[Transaction] validator once for this route and reuses it for every batch
+@app.post("/check_transactions_batch/")
+def check_transactions_batch(transactions: List[Transaction], short_circuit: bool = False):
+    cutoff = fraud_detector.account_cutoff()
+    return [
+        build_response(transaction, fraud_detector.check_fraud(transaction, short_circuit=short_circuit, cutoff=cutoff))
+        for transaction in transactions
+    ]
 
 
 
@@ -1,102 +1,126 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
+from numba import njit
 import altair as alt
-from datetime import datetime
 from typing import List
-from pydantic import BaseModel
 import io
+from streamlit.runtime.uploaded_file_manager import UploadedFile
 
 st.set_page_config(layout="wide")
 
 # Path to the default CSV file
 sample_transaction_data = "sample_transactions.csv"  
 
-# Define the Transaction class
-class Transaction(BaseModel):
-    id: str
-    amount: float
-    payment_channel: str
-    device_type: str
-    transaction_time: datetime
-    location: str
-    high_value_tx_count: int
-    account_creation_date: datetime
-    is_verified: bool
-    transaction_time_weekday: str
+# Datetime columns, parsed by the CSV reader itself
+date_columns = ["transaction_time", "account_creation_date"]
 
 # Define Fraud Rule for evaluation
 class FraudRule:
-    def __init__(self, rule_id, description, action, condition):
+    def __init__(self, rule_id, description, action):
         self.rule_id = rule_id
         self.description = description
         self.action = action
-        self.condition = condition
 
-    def evaluate(self, transaction: Transaction):
-        if self.condition(transaction):
-            return self.action, self.description
-        return None, None
+# Bump whenever a rule changes so cached evaluations are recomputed
+RULES_VERSION = 2
 
-# Initialize fraud detection rules
+# Initialize fraud detection rules (the order matches the columns of evaluate_rules)
 def create_fraud_rules():
     return [
-        FraudRule("R1", "High transaction amount", "review", lambda t: t.amount > 500_000),
-        FraudRule("R2", "Web channel transaction", "reject", lambda t: t.payment_channel == "web"),
-        FraudRule("R3", "Transaction from iOS device", "review", lambda t: t.device_type == "iOS"),
-        FraudRule("R4", "Late-night transaction", "review", lambda t: t.transaction_time.hour < 5 or t.transaction_time.hour >= 23),
-        FraudRule("R5", "Transaction from Lagos, Nigeria", "reject", lambda t: t.location == "Lagos, Nigeria"),
-        FraudRule("R6", "Frequent high-value transactions", "review", lambda t: t.high_value_tx_count > 5),
-        FraudRule("R7", "Account created recently", "review", lambda t: (datetime.now() - t.account_creation_date).days <= 30),
-        FraudRule("R8", "Unverified account", "reject", lambda t: not t.is_verified),
-        FraudRule("R9", "Transaction on weekend", "reject", lambda t: t.transaction_time_weekday in ["Saturday", "Sunday"]),
+        FraudRule("R1", "High transaction amount", "review"),
+        FraudRule("R2", "Web channel transaction", "reject"),
+        FraudRule("R3", "Transaction from iOS device", "review"),
+        FraudRule("R4", "Late-night transaction", "review"),
+        FraudRule("R5", "Transaction from Lagos, Nigeria", "reject"),
+        FraudRule("R6", "Frequent high-value transactions", "review"),
+        FraudRule("R7", "Account created recently", "review"),
+        FraudRule("R8", "Unverified account", "reject"),
+        FraudRule("R9", "Transaction on weekend", "reject"),
     ]
 
-# Load data from the default CSV
-def load_default_data():
-    data = pd.read_csv(sample_transaction_data)
+# Rule kernel: one row per transaction, one column per rule, in this order
+KERNEL_RULE_IDS = ["R1", "R2", "R3", "R4", "R5", "R6", "R7", "R8", "R9"]
+
+@njit(cache=True)
+def evaluate_rules(amount, hour, payment_channel, device_type, location, high_value_tx_count,
+                   recent_account, is_verified, weekday, web_code, ios_code, lagos_code):
+    n = amount.shape[0]
+    hits = np.empty((n, 9), dtype=np.bool_)
+    for i in range(n):
+        hits[i, 0] = amount[i] > 500_000
+        hits[i, 1] = payment_channel[i] == web_code
+        hits[i, 2] = device_type[i] == ios_code
+        hits[i, 3] = hour[i] < 5 or hour[i] >= 23
+        hits[i, 4] = location[i] == lagos_code
+        hits[i, 5] = high_value_tx_count[i] > 5
+        hits[i, 6] = recent_account[i]
+        hits[i, 7] = not is_verified[i]
+        hits[i, 8] = weekday[i] >= 5
+    return hits
+
+# Code of a category value; -2 is never a code (missing is -1), so an absent value matches nothing
+def category_code(column, value):
+    categories = column.cat.categories
+    return categories.get_loc(value) if value in categories else -2
+
+# Parse datetimes (a no-op when the reader already did) and derive the columns the rules need
+def prepare_data(data):
     data["transaction_time"] = pd.to_datetime(data["transaction_time"])
     data["account_creation_date"] = pd.to_datetime(data["account_creation_date"])
+    data["hour"] = data["transaction_time"].dt.hour
+    # Monday=0 ... Sunday=6; replaces the file's string weekday column
+    data["weekday_code"] = data["transaction_time"].dt.weekday.astype("int8")
+    data = data.drop(columns="transaction_time_weekday", errors="ignore")
+    # Same as (now - created).days <= 30, without building a timedelta per row
+    data["recent_account"] = data["account_creation_date"] > pd.Timestamp.now() - pd.Timedelta(days=31)
+    # Low-cardinality strings become categoricals so equality rules compare integer codes
+    for column in ("payment_channel", "device_type", "location"):
+        data[column] = data[column].astype("category")
     return data
 
-# Load data from uploaded file (CSV or XLSX)
+# Load data from the default CSV (expires hourly so recent_account doesn't go stale)
+@st.cache_data(ttl="1h")
+def load_default_data():
+    data = pd.read_csv(sample_transaction_data, engine="pyarrow", parse_dates=date_columns)
+    return prepare_data(data)
+
+# Load data from uploaded file (CSV or XLSX), cached per upload rather than by file contents
+@st.cache_data(ttl="1h", hash_funcs={UploadedFile: lambda f: (f.file_id, f.name, f.size)})
 def load_uploaded_data(uploaded_file):
+    contents = io.BytesIO(uploaded_file.getvalue())
     if uploaded_file.name.endswith('.csv'):
-        data = pd.read_csv(uploaded_file)
+        data = pd.read_csv(contents, engine="pyarrow", parse_dates=date_columns)
     elif uploaded_file.name.endswith('.xlsx'):
-        data = pd.read_excel(uploaded_file)
+        data = pd.read_excel(contents, engine="calamine")
     else:
         st.error("Unsupported file type. Please upload a CSV or XLSX file.")
         return pd.DataFrame()
     
-    data["transaction_time"] = pd.to_datetime(data["transaction_time"])
-    data["account_creation_date"] = pd.to_datetime(data["account_creation_date"])
-    return data
-
-# Convert data to Transaction objects
-def convert_to_transactions(data):
-    transactions = [
-        Transaction(**row) for row in data.to_dict(orient="records")
-    ]
-    return transactions
-
-# Evaluate transactions for fraud
-def evaluate_transactions(transactions: List[Transaction], rules: List[FraudRule]):
-    results = []
-    for tx in transactions:
-        tx_results = []
-        for rule in rules:
-            action, description = rule.evaluate(tx)
-            if action:
-                tx_results.append({"action": action, "reason": description})
-        status = "flagged" if tx_results else "clear"
-        results.append({
-            "id": tx.id,
-            "status": status,
-            "details": tx_results,
-            "weekday": tx.transaction_time_weekday,
-            "location": tx.location  # Added location info
-        })
-    return results
+    return prepare_data(data)
+
+# Evaluate transactions for fraud, cached on the data and the rules version (the rules themselves aren't hashable)
+@st.cache_data
+def evaluate_transactions(data: pd.DataFrame, _rules: List[FraudRule], rules_version: int):
+    # The kernel hard-codes the conditions, so a reordered rule list would mislabel its columns
+    rule_ids = [rule.rule_id for rule in _rules]
+    if rule_ids != KERNEL_RULE_IDS:
+        raise ValueError(f"Rules {rule_ids} don't match the kernel's columns {KERNEL_RULE_IDS}")
+    hits = evaluate_rules(
+        data["amount"].to_numpy(dtype=np.float64),
+        data["hour"].to_numpy(dtype=np.int64),
+        data["payment_channel"].cat.codes.to_numpy(),
+        data["device_type"].cat.codes.to_numpy(),
+        data["location"].cat.codes.to_numpy(),
+        data["high_value_tx_count"].to_numpy(dtype=np.int64),
+        data["recent_account"].to_numpy(dtype=bool),
+        data["is_verified"].to_numpy(dtype=bool),
+        data["weekday_code"].to_numpy(),
+        category_code(data["payment_channel"], "web"),
+        category_code(data["device_type"], "iOS"),
+        category_code(data["location"], "Lagos, Nigeria")
+    )
+    return hits
 
 # Streamlit app layout
 st.title("Fraud Detection Dashboard")
@@ -109,24 +133,30 @@ else:
     st.write("Loading data from default CSV...")
     data = load_default_data()
 
-# Convert to Transaction objects
-transactions = convert_to_transactions(data)
-
 # Initialize fraud detection rules
 fraud_rules = create_fraud_rules()
 
 # Evaluate transactions
-fraud_results = evaluate_transactions(transactions, fraud_rules)
-
-# Convert results to DataFrame
-results_df = pd.DataFrame(fraud_results)
+hits = evaluate_transactions(data, fraud_rules, RULES_VERSION)
+
+# Results stay as the hit matrix plus per-rule metadata; nothing is built per row
+rule_actions = np.array([rule.action for rule in fraud_rules])
+rule_outcomes = np.array([f"{rule.action} ({rule.description})" for rule in fraud_rules])
+flagged = hits.any(axis=1)
+rejected = hits[:, rule_actions == "reject"].any(axis=1)
+
+# Per-rule hit counts feed the scorecards and both reason charts
+reason_counts = pd.DataFrame({
+    "reason": [rule.description for rule in fraud_rules],
+    "count": hits.sum(axis=0)
+})
 
 # Scorecards
-total_transactions = len(results_df)
-total_flagged = len(results_df[results_df["status"] == "flagged"])
-total_cleared = len(results_df[results_df["status"] == "clear"])
-total_review = len([detail for details in results_df["details"] for detail in details if detail["action"] == "review"])
-total_reject = len([detail for details in results_df["details"] for detail in details if detail["action"] == "reject"])
+total_transactions = len(data)
+total_flagged = int(flagged.sum())
+total_cleared = total_transactions - total_flagged
+total_review = int(reason_counts["count"][rule_actions == "review"].sum())
+total_reject = int(reason_counts["count"][rule_actions == "reject"].sum())
 
 # Display scorecards
 st.subheader("Summary")
@@ -137,18 +167,11 @@ col3.metric("Total Cleared", total_cleared)
 col4.metric("Total Reviews", total_review)
 col5.metric("Total Rejections", total_reject)
 
+# Charts below are fed pre-aggregated counts (at most one row per rule or location), never per-transaction rows;
+# st.altair_chart ships chart data as Arrow through its own data transformer, so no vegafusion step is needed
 # Visualization: Reasons for Flagged Transactions
 st.subheader("Reasons for Flagged Transactions")
-reasons = []
-for result in results_df["details"]:
-    for reason in result:
-        reasons.append(reason["reason"])
-
-reasons_df = pd.DataFrame(reasons, columns=['reason'])
-reason_counts = reasons_df['reason'].value_counts().reset_index()
-reason_counts.columns = ['reason', 'count']
-
-reason_chart = alt.Chart(reason_counts).mark_bar().encode(
+reason_chart = alt.Chart(reason_counts[reason_counts["count"] > 0]).mark_bar().encode(
     x=alt.X('reason', title='Fraud Reason', sort='-y'),
     y=alt.Y('count', title='Count'),
     color='reason'
@@ -157,15 +180,7 @@ st.altair_chart(reason_chart, use_container_width=True)
 
 # Visualization: Reasons for Rejected Transactions
 st.subheader("Reasons for Rejected Transactions")
-reasons_rejected = []
-for result in results_df[results_df["status"] == "flagged"]["details"]:
-    for reason in result:
-        if reason["action"] == "reject":
-            reasons_rejected.append(reason["reason"])
-
-reasons_rejected_df = pd.DataFrame(reasons_rejected, columns=['reason'])
-reason_rejected_counts = reasons_rejected_df['reason'].value_counts().reset_index()
-reason_rejected_counts.columns = ['reason', 'count']
+reason_rejected_counts = reason_counts[(rule_actions == "reject") & (reason_counts["count"] > 0)]
 
 reason_rejected_chart = alt.Chart(reason_rejected_counts).mark_bar().encode(
     x=alt.X('reason', title='Fraud Reason', sort='-y'),
@@ -177,14 +192,20 @@ st.altair_chart(reason_rejected_chart, use_container_width=True)
 # Visualization: Flagged Transactions by Location (Pie Chart) and Rejected Transactions by Location (Pie Chart)
 st.subheader("Transaction Analysis by Location")
 
+# Flagged and rejected counts per location, counted straight off the category codes (missing locations are skipped)
+locations = data["location"].cat.categories
+location_codes = data["location"].cat.codes.to_numpy()
+location_flagged = np.bincount(location_codes[flagged & (location_codes >= 0)], minlength=len(locations))
+location_rejected = np.bincount(location_codes[rejected & (location_codes >= 0)], minlength=len(locations))
+
 # Create two columns for side-by-side display
 col1, col2 = st.columns(2)
 
 # Flagged Transactions by Location
 with col1:
     st.subheader("Flagged Transactions by Location")
-    location_counts = results_df[results_df["status"] == "flagged"]['location'].value_counts().reset_index()
-    location_counts.columns = ['location', 'count']
+    location_counts = pd.DataFrame({"location": locations, "count": location_flagged})
+    location_counts = location_counts[location_counts["count"] > 0]
 
     location_chart = alt.Chart(location_counts).mark_arc().encode(
         theta="count:Q",
@@ -196,8 +217,8 @@ with col1:
 # Rejected Transactions by Location
 with col2:
     st.subheader("Rejected Transactions by Location")
-    rejected_location_counts = results_df[results_df["status"] == "flagged"][results_df["details"].apply(lambda x: any(item['action'] == "reject" for item in x))]['location'].value_counts().reset_index()
-    rejected_location_counts.columns = ['location', 'count']
+    rejected_location_counts = pd.DataFrame({"location": locations, "count": location_rejected})
+    rejected_location_counts = rejected_location_counts[rejected_location_counts["count"] > 0]
 
     rejected_location_chart = alt.Chart(rejected_location_counts).mark_arc().encode(
         theta="count:Q",
@@ -206,12 +227,15 @@ with col2:
     )
     st.altair_chart(rejected_location_chart, use_container_width=True)
 
-# Add table with detailed evaluations
+# Add table with detailed evaluations, built only for the page being viewed
 st.subheader("Fraud Evaluation Table")
+page_size = 1000
+page = st.number_input("Page", min_value=1, max_value=max(1, -(-total_transactions // page_size)), value=1)
+page_rows = slice((page - 1) * page_size, page * page_size)
 evaluation_table = pd.DataFrame({
-    "Transaction ID": results_df["id"],
-    "Status": results_df["status"],
-    "Evaluation Details": results_df["details"].apply(lambda x: ', '.join([f"{item['action']} ({item['reason']})" for item in x]) if x else 'None')
+    "Transaction ID": data["id"].to_numpy()[page_rows],
+    "Status": np.where(flagged[page_rows], "flagged", "clear"),
+    "Evaluation Details": [', '.join(rule_outcomes[row_hits]) or 'None' for row_hits in hits[page_rows]]
 })
 st.dataframe(evaluation_table)
 